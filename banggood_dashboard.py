@@ -1,9 +1,37 @@
+import io
+import math
 import streamlit as st
-import pandas as pd
-import pyodbc
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import polars as pl
+import turbodbc
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Narrower column types applied to the products table at load time
+# (float columns stay float64: they are shown as-is and compared against
+# slider bounds, where float32 rounding would surface)
+PRODUCT_TYPES = {
+    'review_count': pa.int32(),
+}
+PRODUCT_CATEGORICALS = ['category', 'price_category']
+
+# Quantiles summarised per category for the price box plot
+BOX_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+# Filter-dependent results kept per (category, price, rating) bucket; only
+# small outputs (KPIs, figures, top-10 tables) are cached per bucket
+SELECTION_CACHE_ENTRIES = 32
+
+# Above this many rows the scatter plot is replaced by a binned heatmap
+SCATTER_POINT_LIMIT = 5000
+
+# CSV exports kept in cache (one per filter combination)
+EXPORT_CACHE_ENTRIES = 32
+
 # Page configuration
 st.set_page_config(
     page_title="Banggood Product Analytics",
@@ -13,33 +41,329 @@ st.set_page_config(
 )
 
 # Database connection function
-@st.cache_resource
-def init_connection():
-    try:
-        conn = pyodbc.connect(
+def connect():
+    return turbodbc.connect(
+        connection_string=(
             'DRIVER={SQL Server};'
             'SERVER=DESKTOP-Q5EPGSU;'
             'DATABASE=BanggoodAnalysis;'
             'Trusted_Connection=yes;'
-        )
-        return conn
+        ),
+        turbodbc_options=turbodbc.make_options(prefer_unicode=True)
+    )
+
+# Ping a pooled connection on checkout; a dead one is discarded and the
+# pool retries with a fresh connection (a dialect-less pool can't pre_ping)
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+# Connection pool shared by all sessions, so concurrent users and queries
+# each get their own connection instead of queueing on a single one
+@st.cache_resource
+def init_connection():
+    try:
+        pool = QueuePool(connect, pool_size=8, max_overflow=4)
+        event.listen(pool, 'checkout', ping_connection)
+        pool.connect().close()
+        return pool
     except Exception as e:
         st.error(f"Database connection failed: {e}")
         return None
 
-# Load data with caching
-@st.cache_data
-def load_data():
-    conn = init_connection()
-    if conn:
+# Run a query on a pooled connection and fetch the result straight into an
+# Arrow table (columnar buffers, no per-row Python objects)
+def fetch_arrow(pool, query, params=None):
+    conn = pool.connect()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params or [])
+            return cursor.fetchallarrow()
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+# Downcast integer columns and dictionary-encode low-cardinality strings,
+# shrinking the bytes every filter and reduction has to scan
+def compact_types(table):
+    for name, type_ in PRODUCT_TYPES.items():
+        if name in table.column_names:
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, name, table[name].cast(type_))
+    for name in PRODUCT_CATEGORICALS:
+        if name in table.column_names:
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, name, table[name].dictionary_encode())
+    return table.combine_chunks()
+
+# Load products as a cached Polars frame (Arrow-backed, converted once)
+# The category filter is pushed down into SQL; price/rating sliders are
+# applied in memory so moving them does not hit the database.
+# Nothing mutates the frame, so the same object is handed to every rerun
+# and session (cache_resource) instead of being unpickled on each hit
+@st.cache_resource(ttl=600)
+def load_data(category):
+    pool = init_connection()
+    if pool:
         query = "SELECT * FROM products"
-        return pd.read_sql_query(query, conn)
+        params = []
+        if category is not None:
+            query += " WHERE category = ?"
+            params.append(category)
+        return pl.from_arrow(compact_types(fetch_arrow(pool, query, params)))
+    return None
+
+# Lazily filter products by price/rating range; Polars fuses the predicate
+# with whatever is collected from it into a single parallel pass
+def filter_products(frame, min_price, max_price, min_rating, max_rating):
+    return frame.lazy().filter(
+        pl.col('price').is_between(min_price, max_price)
+        & pl.col('rating').is_between(min_rating, max_rating)
+    )
+
+# KPI reductions over a filtered lazy frame, computed in one select
+def summarize_kpis(filtered):
+    return filtered.select(
+        pl.len().alias('product_count'),
+        pl.col('price').mean().alias('avg_price'),
+        pl.col('rating').mean().alias('avg_rating'),
+        pl.col('review_count').cast(pl.Int64).sum().alias('total_reviews')
+    )
+
+# Top-k rows by a column via partial selection instead of a full sort;
+# rows missing the metric are never ranked (as with DataFrame.nlargest)
+def top_k(frame, col, k=10):
+    return frame.drop_nulls(col).top_k(k, by=col).sort(col, descending=True)
+
+# Group the filtered rows by category in a single hash pass shared by the
+# box plot and, for small selections, the scatter; per-product point lists
+# are only collected when the scatter will draw them
+def group_products(table, with_points):
+    aggregations = [('price', 'tdigest', pc.TDigestOptions(q=BOX_QUANTILES))]
+    if with_points:
+        aggregations += [
+            ('price', 'list'),
+            ('rating', 'list'),
+            ('review_count', 'list'),
+            ('name', 'list')
+        ]
+    grouped = table.group_by('category').aggregate(aggregations)
+    # The key is dictionary-encoded, which Arrow can't sort directly
+    order = pc.sort_indices(grouped['category'].cast(pa.string()))
+    return grouped.take(order).combine_chunks()
+
+# Box plot from the grouped t-digest quartiles so raw prices never reach
+# the browser (O(categories x 5) floats instead of O(rows))
+def build_price_box(groups):
+    fig = go.Figure()
+    for category, quantiles in zip(groups['category'].to_pylist(), groups['price_tdigest'].to_pylist()):
+        lo, q1, median, q3, hi = quantiles
+        iqr = q3 - q1
+        fig.add_trace(go.Box(
+            name=category,
+            q1=[q1],
+            median=[median],
+            q3=[q3],
+            lowerfence=[max(lo, q1 - 1.5 * iqr)],
+            upperfence=[min(hi, q3 + 1.5 * iqr)]
+        ))
+    fig.update_layout(
+        title='Price Distribution by Category',
+        xaxis_title='category',
+        yaxis_title='price',
+        showlegend=False
+    )
+    return fig
+
+# Rating histogram from bin counts computed here rather than in plotly.js
+# Bins span the full 0-5 rating scale so they stay put as filters change
+def build_rating_histogram(table, bins=20):
+    counts, edges = np.histogram(table['rating'].to_numpy(), bins=bins, range=(0.0, 5.0))
+    fig = go.Figure(go.Bar(
+        x=0.5 * (edges[1:] + edges[:-1]),
+        y=counts,
+        marker_color='#FF4B4B'
+    ))
+    fig.update_layout(
+        title='Rating Distribution',
+        xaxis_title='rating',
+        yaxis_title='count',
+        bargap=0
+    )
+    return fig
+
+# Price vs rating as a 2-D histogram, sending bin counts instead of points
+def build_price_rating_density(table, price_range, rating_range):
+    counts, price_edges, rating_edges = np.histogram2d(
+        table['price'].to_numpy(),
+        table['rating'].to_numpy(),
+        bins=(60, 30),
+        range=(price_range, rating_range)
+    )
+    fig = go.Figure(go.Heatmap(
+        x=0.5 * (price_edges[1:] + price_edges[:-1]),
+        y=0.5 * (rating_edges[1:] + rating_edges[:-1]),
+        z=counts.T,
+        colorscale='Viridis',
+        colorbar=dict(title='products')
+    ))
+    fig.update_layout(
+        title='Price vs Rating Correlation',
+        xaxis_title='price',
+        yaxis_title='rating'
+    )
+    return fig
+
+# Price vs rating scatter drawn with WebGL, one trace per category
+def build_price_rating_scatter(groups):
+    max_reviews = pc.max(pc.list_flatten(groups['review_count_list'])).as_py() or 1
+    fig = go.Figure()
+    for i, category in enumerate(groups['category'].to_pylist()):
+        fig.add_trace(go.Scattergl(
+            x=groups['price_list'][i].values.to_numpy(),
+            y=groups['rating_list'][i].values.to_numpy(),
+            mode='markers',
+            name=category,
+            text=groups['name_list'][i].values.to_pylist(),
+            hovertemplate='%{text}<br>price=%{x}<br>rating=%{y}<extra></extra>',
+            marker=dict(
+                size=groups['review_count_list'][i].values.to_numpy(),
+                sizemode='area',
+                sizeref=max_reviews / 20 ** 2,
+                sizemin=1
+            )
+        ))
+    fig.update_layout(
+        title='Price vs Rating Correlation',
+        xaxis_title='price',
+        yaxis_title='rating'
+    )
+    return fig
+
+# Map an empty-selection aggregate (None) to NaN
+def as_float(value):
+    return float('nan') if value is None else value
+
+# Whole-table aggregates for slider bounds and KPI deltas
+@st.cache_data(ttl=600)
+def load_global_stats():
+    pool = init_connection()
+    if pool:
+        query = """
+        SELECT
+            COUNT(*) as product_count,
+            MIN(price) as min_price,
+            MAX(price) as max_price,
+            AVG(price) as avg_price,
+            AVG(rating) as avg_rating,
+            SUM(review_count) as total_reviews
+        FROM products
+        """
+        return fetch_arrow(pool, query).to_pylist()[0]
+    return None
+
+# Lazy selection of the products matching one filter combination; callers
+# collect only what they need, so filtered rows are never cached
+def select_products(category, min_price, max_price, min_rating, max_rating):
+    frame = load_data(category)
+    if frame is None:
+        return None
+    return filter_products(frame, min_price, max_price, min_rating, max_rating)
+
+# KPIs for one filter combination. Sliders snap to coarse steps, so
+# revisiting a range is a cache hit instead of a recompute
+@st.cache_data(ttl=600, max_entries=SELECTION_CACHE_ENTRIES)
+def load_kpis(category, min_price, max_price, min_rating, max_rating):
+    selection = select_products(category, min_price, max_price, min_rating, max_rating)
+    if selection is None:
+        return None
+    return summarize_kpis(selection).collect().row(0, named=True)
+
+# Price box, rating histogram and price/rating figures for one filter
+# combination, built once per slider bucket
+@st.cache_resource(ttl=600, max_entries=SELECTION_CACHE_ENTRIES)
+def build_product_charts(category, min_price, max_price, min_rating, max_rating):
+    selection = select_products(category, min_price, max_price, min_rating, max_rating)
+    
+    # Arrow view of the selection for the chart helpers (not kept afterwards)
+    filtered = selection.collect().to_arrow(compat_level=pl.CompatLevel.oldest())
+    show_points = filtered.num_rows <= SCATTER_POINT_LIMIT
+    groups = group_products(filtered, show_points)
+    
+    fig_price = build_price_box(groups)
+    fig_rating = build_rating_histogram(filtered)
+    
+    # Binned for large selections
+    if not show_points:
+        fig_scatter = build_price_rating_density(
+            filtered,
+            (min_price, max_price),
+            (min_rating, max_rating)
+        )
+    else:
+        fig_scatter = build_price_rating_scatter(groups)
+    return fig_price, fig_rating, fig_scatter
+
+# Top-10 products by one column for one filter combination
+@st.cache_resource(ttl=600, max_entries=SELECTION_CACHE_ENTRIES)
+def rank_products(category, min_price, max_price, min_rating, max_rating, col, columns):
+    selection = select_products(category, min_price, max_price, min_rating, max_rating)
+    return top_k(selection.select(list(columns)), col).collect()
+
+# CSV export of the current selection, cached per filter combination and
+# written by Polars' multi-threaded CSV writer instead of DataFrame.to_csv
+@st.cache_data(ttl=600, max_entries=EXPORT_CACHE_ENTRIES)
+def export_csv(category, min_price, max_price, min_rating, max_rating):
+    selection = select_products(category, min_price, max_price, min_rating, max_rating)
+    if selection is None:
+        return b""
+    buffer = io.BytesIO()
+    selection.collect().write_csv(buffer)
+    return buffer.getvalue()
+
+# Product counts per price bucket, aggregated by the database
+# (price_category is a stored column, so only a handful of rows come back)
+@st.cache_data(ttl=600)
+def load_price_cat_counts(category, min_price, max_price, min_rating, max_rating):
+    pool = init_connection()
+    if pool:
+        query = """
+        SELECT
+            price_category,
+            COUNT(*) as count
+        FROM products
+        WHERE price BETWEEN ? AND ?
+            AND rating BETWEEN ? AND ?
+        """
+        params = [min_price, max_price, min_rating, max_rating]
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        query += " GROUP BY price_category"
+        return fetch_arrow(pool, query, params).to_pandas()
     return None
 
+# Distinct categories for the sidebar, sorted by the database
+@st.cache_data(ttl=600)
+def load_categories():
+    pool = init_connection()
+    if pool:
+        query = "SELECT DISTINCT category FROM products ORDER BY category"
+        return fetch_arrow(pool, query)['category'].to_pylist()
+    return []
+
 @st.cache_data
 def load_category_summary():
-    conn = init_connection()
-    if conn:
+    pool = init_connection()
+    if pool:
         query = """
         SELECT 
             category,
@@ -51,54 +375,106 @@ def load_category_summary():
         FROM products 
         GROUP BY category
         """
-        return pd.read_sql_query(query, conn)
+        return fetch_arrow(pool, query)
     return None
 
+# Horizontal bar of one category metric, ascending, coloured by value;
+# ordering is an argsort index rather than a sorted copy of the frame
+def build_category_bar(categories, values, metric, title):
+    order = np.argsort(values)
+    fig = go.Figure(go.Bar(
+        y=categories[order],
+        x=values[order],
+        orientation='h',
+        marker=dict(
+            color=values[order],
+            colorscale='Plasma',
+            colorbar=dict(title=metric)
+        )
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=metric,
+        yaxis_title='category'
+    )
+    return fig
+
+# Category bar charts depend only on the (filter-independent) category
+# summary, so the figures are built once and reused across reruns
+@st.cache_resource
+def build_category_bars():
+    category_table = load_category_summary()
+    if category_table is None:
+        return None
+    
+    categories = category_table['category'].to_numpy()
+    
+    # Products by category
+    fig_bar = build_category_bar(
+        categories, category_table['product_count'].to_numpy(),
+        'product_count', 'Products by Category'
+    )
+    
+    # Average price by category
+    fig_price_bar = build_category_bar(
+        categories, category_table['avg_price'].to_numpy(),
+        'avg_price', 'Average Price by Category'
+    )
+    
+    # Average rating by category
+    fig_rating_bar = build_category_bar(
+        categories, category_table['avg_rating'].to_numpy(),
+        'avg_rating', 'Average Rating by Category'
+    )
+    return fig_bar, fig_price_bar, fig_rating_bar
+
 def main():
     # Title and description
     st.title("📊 Banggood Product Analytics Dashboard")
     st.markdown("Real-time analysis of product data from Banggood SQL Database")
     
-    # Load data
-    df = load_data()
-    if df is None:
+    # Load summary data
+    stats = load_global_stats()
+    if stats is None:
         st.error("Failed to load data from database")
         return
     
-    category_df = load_category_summary()
-    
     # Sidebar filters
     st.sidebar.header("🔍 Filters")
     
     # Category filter
-    categories = ['All'] + sorted(df['category'].unique().tolist())
+    categories = ['All'] + load_categories()
     selected_category = st.sidebar.selectbox("Select Category", categories)
     
-    # Price range filter
+    # Price range filter ($1 steps)
+    price_floor = float(math.floor(stats['min_price']))
+    price_ceil = float(math.ceil(stats['max_price']))
     min_price, max_price = st.sidebar.slider(
         "Price Range ($)",
-        float(df['price'].min()),
-        float(df['price'].max()),
-        (float(df['price'].min()), float(df['price'].max()))
+        price_floor,
+        price_ceil,
+        (price_floor, price_ceil),
+        step=1.0
     )
     
-    # Rating filter
+    # Rating filter (0.1 steps)
     min_rating, max_rating = st.sidebar.slider(
         "Rating Range",
-        0.0, 5.0, (3.0, 5.0)
+        0.0, 5.0, (3.0, 5.0),
+        step=0.1
     )
     
-    # Apply filters
-    filtered_df = df.copy()
-    if selected_category != 'All':
-        filtered_df = filtered_df[filtered_df['category'] == selected_category]
-    
-    filtered_df = filtered_df[
-        (filtered_df['price'] >= min_price) & 
-        (filtered_df['price'] <= max_price) &
-        (filtered_df['rating'] >= min_rating) & 
-        (filtered_df['rating'] <= max_rating)
-    ]
+    # Apply filters; rounding keeps float noise out of the cache keys
+    category_filter = None if selected_category == 'All' else selected_category
+    filters = (
+        category_filter,
+        float(round(min_price)), float(round(max_price)),
+        round(min_rating, 1), round(max_rating, 1)
+    )
+    kpis = load_kpis(*filters)
+    if kpis is None:
+        st.error("Failed to load data from database")
+        return
     
     # KPI Metrics
     st.header("📈 Key Performance Indicators")
@@ -108,83 +484,59 @@ def main():
     with col1:
         st.metric(
             label="Total Products",
-            value=f"{len(filtered_df):,}",
-            delta=f"{len(filtered_df) - len(df)}" if selected_category != 'All' else None
+            value=f"{kpis['product_count']:,}",
+            delta=f"{kpis['product_count'] - stats['product_count']}" if selected_category != 'All' else None
         )
     
     with col2:
-        avg_price = filtered_df['price'].mean()
+        avg_price = as_float(kpis['avg_price'])
         st.metric(
             label="Average Price",
             value=f"${avg_price:.2f}",
-            delta=f"${avg_price - df['price'].mean():.2f}" if selected_category != 'All' else None
+            delta=f"${avg_price - stats['avg_price']:.2f}" if selected_category != 'All' else None
         )
     
     with col3:
-        avg_rating = filtered_df['rating'].mean()
+        avg_rating = as_float(kpis['avg_rating'])
         st.metric(
             label="Average Rating",
             value=f"{avg_rating:.2f}/5",
-            delta=f"{avg_rating - df['rating'].mean():.2f}" if selected_category != 'All' else None
+            delta=f"{avg_rating - stats['avg_rating']:.2f}" if selected_category != 'All' else None
         )
     
     with col4:
-        total_reviews = filtered_df['review_count'].sum()
+        total_reviews = kpis['total_reviews']
         st.metric(
             label="Total Reviews",
             value=f"{total_reviews:,}",
-            delta=f"{total_reviews - df['review_count'].sum():,}" if selected_category != 'All' else None
+            delta=f"{total_reviews - stats['total_reviews']:,}" if selected_category != 'All' else None
         )
     
     # Charts Row 1
     st.header("📊 Product Analysis")
     
+    fig_price, fig_rating, fig_scatter = build_product_charts(*filters)
+    
     col1, col2 = st.columns(2)
     
     with col1:
         # Price distribution by category
-        fig_price = px.box(
-            filtered_df, 
-            x='category', 
-            y='price',
-            title='Price Distribution by Category',
-            color='category'
-        )
-        fig_price.update_layout(showlegend=False)
-        st.plotly_chart(fig_price, use_container_width=True)
+        st.plotly_chart(fig_price, use_container_width=True, key='price-chart')
     
     with col2:
         # Rating distribution
-        fig_rating = px.histogram(
-            filtered_df, 
-            x='rating',
-            title='Rating Distribution',
-            nbins=20,
-            color_discrete_sequence=['#FF4B4B']
-        )
-        st.plotly_chart(fig_rating, use_container_width=True)
+        st.plotly_chart(fig_rating, use_container_width=True, key='rating-chart')
     
     # Charts Row 2
     col1, col2 = st.columns(2)
     
     with col1:
         # Price vs Rating scatter plot
-        fig_scatter = px.scatter(
-            filtered_df,
-            x='price',
-            y='rating',
-            color='category',
-            size='review_count',
-            hover_data=['name'],
-            title='Price vs Rating Correlation',
-            size_max=20
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
+        st.plotly_chart(fig_scatter, use_container_width=True, key='scatter-chart')
     
     with col2:
         # Products by price category
-        price_cat_count = filtered_df['price_category'].value_counts().reset_index()
-        price_cat_count.columns = ['price_category', 'count']
+        price_cat_count = load_price_cat_counts(*filters)
         
         fig_pie = px.pie(
             price_cat_count,
@@ -192,86 +544,71 @@ def main():
             names='price_category',
             title='Products by Price Category'
         )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        st.plotly_chart(fig_pie, use_container_width=True, key='pie-chart')
     
     # Category Performance
     st.header("🏆 Category Performance")
     
-    if category_df is not None:
+    category_bars = build_category_bars()
+    if category_bars is not None:
+        fig_bar, fig_price_bar, fig_rating_bar = category_bars
         col1, col2, col3 = st.columns(3)
         
         with col1:
             # Products by category
-            fig_bar = px.bar(
-                category_df.sort_values('product_count', ascending=True),
-                y='category',
-                x='product_count',
-                title='Products by Category',
-                orientation='h',
-                color='product_count'
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(fig_bar, use_container_width=True, key='bar-chart')
         
         with col2:
             # Average price by category
-            fig_price_bar = px.bar(
-                category_df.sort_values('avg_price', ascending=True),
-                y='category',
-                x='avg_price',
-                title='Average Price by Category',
-                orientation='h',
-                color='avg_price'
-            )
-            st.plotly_chart(fig_price_bar, use_container_width=True)
+            st.plotly_chart(fig_price_bar, use_container_width=True, key='price-bar-chart')
         
         with col3:
             # Average rating by category
-            fig_rating_bar = px.bar(
-                category_df.sort_values('avg_rating', ascending=True),
-                y='category',
-                x='avg_rating',
-                title='Average Rating by Category',
-                orientation='h',
-                color='avg_rating'
-            )
-            st.plotly_chart(fig_rating_bar, use_container_width=True)
+            st.plotly_chart(fig_rating_bar, use_container_width=True, key='rating-bar-chart')
     
     # Top Products Section
     st.header("🎯 Top Performing Products")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["🏆 Best Rated", "🔥 Most Reviewed", "💰 Best Value", "📈 Most Popular"])
+    # Only the selected ranking is computed (st.tabs would run every body)
+    view = st.radio(
+        "Ranking",
+        ["🏆 Best Rated", "🔥 Most Reviewed", "💰 Best Value", "📈 Most Popular"],
+        horizontal=True,
+        label_visibility="collapsed",
+        key='top-products-view'
+    )
     
-    with tab1:
+    if view == "🏆 Best Rated":
         # Best rated products
-        best_rated = filtered_df.nlargest(10, 'rating')[['name', 'category', 'price', 'rating', 'review_count']]
+        best_rated = rank_products(*filters, 'rating', ('name', 'category', 'price', 'rating', 'review_count'))
         st.dataframe(best_rated, use_container_width=True)
     
-    with tab2:
+    elif view == "🔥 Most Reviewed":
         # Most reviewed products
-        most_reviewed = filtered_df.nlargest(10, 'review_count')[['name', 'category', 'price', 'rating', 'review_count']]
+        most_reviewed = rank_products(*filters, 'review_count', ('name', 'category', 'price', 'rating', 'review_count'))
         st.dataframe(most_reviewed, use_container_width=True)
     
-    with tab3:
+    elif view == "💰 Best Value":
         # Best value products
-        best_value = filtered_df.nlargest(10, 'value_score')[['name', 'category', 'price', 'rating', 'value_score']]
+        best_value = rank_products(*filters, 'value_score', ('name', 'category', 'price', 'rating', 'value_score'))
         st.dataframe(best_value, use_container_width=True)
     
-    with tab4:
+    else:
         # Most popular products
-        most_popular = filtered_df.nlargest(10, 'popularity_index')[['name', 'category', 'price', 'rating', 'popularity_index']]
+        most_popular = rank_products(*filters, 'popularity_index', ('name', 'category', 'price', 'rating', 'popularity_index'))
         st.dataframe(most_popular, use_container_width=True)
     
     # Raw Data Section
     st.header("📋 Raw Data Explorer")
     
     with st.expander("View Raw Data"):
-        st.dataframe(filtered_df, use_container_width=True)
+        st.dataframe(select_products(*filters).collect(), use_container_width=True)
         
         # Data download
-        csv = filtered_df.to_csv(index=False)
+        # The CSV is only built when the button is clicked
         st.download_button(
             label="📥 Download Filtered Data as CSV",
-            data=csv,
+            data=lambda: export_csv(*filters),
             file_name="banggood_filtered_data.csv",
             mime="text/csv"
         )